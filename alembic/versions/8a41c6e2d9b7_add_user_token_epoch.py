@@ -0,0 +1,28 @@
+"""add_user_token_epoch
+
+Revision ID: 8a41c6e2d9b7
+Revises: 3f9c1d2a7e41
+Create Date: 2026-10-19 14:37:52.091466
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8a41c6e2d9b7'
+down_revision: Union[str, Sequence[str], None] = '3f9c1d2a7e41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('token_epoch', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'token_epoch')
@@ -13,8 +13,9 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.session import get_session
-from app.models.models import User
-from app.schemas.auth_schema import Token
+from app.models.models import User, UserRole
+from app.schemas.auth_schema import Token, TokenData
+from app.api.token_epochs import TokenEpochCache
 from app.schemas.user_schema import UserInPublic, UserCreate
 
 class AuthSettings(BaseSettings):
@@ -22,6 +23,9 @@ class AuthSettings(BaseSettings):
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
     refresh_token_expire_days: int = 7
+    stateless_roles: bool = False
+    token_epoch_refresh_seconds: float = 5
+    token_epoch_idle_seconds: float = 15 * 60
 
     class Config:
         env_file = ".env"
@@ -30,6 +34,11 @@ class AuthSettings(BaseSettings):
 
 settings = AuthSettings()
 
+epoch_cache = TokenEpochCache(
+    refresh_seconds=settings.token_epoch_refresh_seconds,
+    idle_seconds=settings.token_epoch_idle_seconds
+)
+
 DBSession = Annotated[AsyncSession, Depends(get_session)]
 
 password_hasher = PasswordHash.recommended()
@@ -68,6 +77,9 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None) -> s
         })
     return jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
 
+def access_token_claims(user: User) -> dict:
+    return {"sub": user.username, "uid": user.id, "role": user.role.value, "token_epoch": user.token_epoch}
+
 def create_refresh_token(data: dict, expires_delta: timedelta | None = None) -> str:
     to_encode = data.copy()
     now = datetime.now(timezone.utc)
@@ -95,6 +107,38 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: DB
     
     return user
 
+async def get_current_principal(token: Annotated[str, Depends(oauth2_scheme)], db: DBSession) -> User | TokenData:
+    if not settings.stateless_roles:
+        return await get_current_user(token, db)
+
+    try:
+        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+    except JWTError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not auth")
+
+    if payload.get("type") != "access":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
+
+    try:
+        principal = TokenData(
+            id=payload["uid"],
+            username=payload["sub"],
+            role=UserRole(payload["role"]),
+            token_epoch=payload["token_epoch"]
+        )
+    except (KeyError, ValueError):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
+
+    cached = await epoch_cache.get(principal.id)
+    if cached is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token revoked")
+
+    current_epoch, current_role = cached
+    if principal.token_epoch != current_epoch or principal.role != current_role:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token revoked")
+
+    return principal
+
 @router.post("/register", response_model=UserInPublic, status_code=201)
 async def create_user(db: DBSession, user: UserCreate):
     existing_user = await get_user_from_db(db, user.username)
@@ -128,7 +172,7 @@ async def login_for_tokens(db: DBSession, form_data: Annotated[OAuth2PasswordReq
     if not user or not verify_password(form_data.password, user.hashed_password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credetials")
     
-    access_token = create_access_token(data={"sub": form_data.username}, expires_delta=timedelta(minutes=30))
+    access_token = create_access_token(data=access_token_claims(user), expires_delta=timedelta(minutes=30))
     refresh_token = create_refresh_token(data={"sub": form_data.username}, expires_delta=timedelta(days=7))
 
     user.refresh_token = refresh_token
@@ -163,7 +207,7 @@ async def refresh_tokens(db: DBSession, refresh_token: str):
     if user.refresh_token_expire < datetime.now(timezone.utc):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Refresh token expired")
     
-    new_access_token = create_access_token(data={"sub": user.username}, expires_delta=timedelta(minutes=30))
+    new_access_token = create_access_token(data=access_token_claims(user), expires_delta=timedelta(minutes=30))
     new_refresh_token = create_refresh_token(data={"sub": user.username}, expires_delta=timedelta(days=7))
  
     user.refresh_token = new_refresh_token
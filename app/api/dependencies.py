@@ -4,16 +4,20 @@ from typing import Annotated
 
 from app.db.session import get_session
 from app.models.models import User, UserRole
-from app.api.authorization import get_current_user
+from app.schemas.auth_schema import TokenData
+from app.api.authorization import get_current_user, get_current_principal
+from app.api.idempotency import IdempotencyContext, idempotency
 
 DBSession = Annotated[AsyncSession, Depends(get_session)] 
 CurrentUser = Annotated[User, Depends(get_current_user)]
+CurrentPrincipal = Annotated[User | TokenData, Depends(get_current_principal)]
+Idempotent = Annotated[IdempotencyContext, Depends(idempotency)]
 
 class RoleChecker:
     def __init__(self, allowed_roles: list[UserRole]):
             self.allowed_roles = allowed_roles
 
-    def __call__(self, user: CurrentUser):
+    def __call__(self, user: CurrentPrincipal):
         if user.role not in self.allowed_roles:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -21,6 +25,6 @@ class RoleChecker:
             )
         return user
 
-AllowAdmin = Annotated[User, Depends(RoleChecker([UserRole.ADMIN]))]
-AllowSeller = Annotated[User, Depends(RoleChecker([UserRole.SELLER, UserRole.ADMIN]))]
-AllowAll = Annotated[User, Depends(RoleChecker([UserRole.BUYER, UserRole.SELLER, UserRole.ADMIN]))]
\ No newline at end of file
+AllowAdmin = Annotated[User | TokenData, Depends(RoleChecker([UserRole.ADMIN]))]
+AllowSeller = Annotated[User | TokenData, Depends(RoleChecker([UserRole.SELLER, UserRole.ADMIN]))]
+AllowAll = Annotated[User | TokenData, Depends(RoleChecker([UserRole.BUYER, UserRole.SELLER, UserRole.ADMIN]))]
\ No newline at end of file
@@ -0,0 +1,289 @@
+import asyncio
+import hashlib
+import json
+import logging
+import secrets
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Annotated, Any, AsyncGenerator
+
+from fastapi import Depends, Header, HTTPException, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from redis import asyncio as aioredis
+
+from sqlalchemy import select, delete, update
+from sqlalchemy.dialects.postgresql import insert
+
+from app.api.authorization import get_current_principal
+from app.db.session import async_session_maker
+from app.models.models import IdempotencyRecord, User
+from app.schemas.auth_schema import TokenData
+
+logger = logging.getLogger(__name__)
+
+class IdempotencySettings(BaseSettings):
+    backend: str = "postgres"
+    redis_url: str = "redis://localhost:6379/0"
+    ttl_seconds: int = 24 * 60 * 60
+    wait_timeout_seconds: float = 10
+    poll_interval_seconds: float = 0.1
+    max_poll_interval_seconds: float = 1
+    purge_interval_seconds: float = 10 * 60
+
+    model_config = SettingsConfigDict(env_file=".env", env_prefix="IDEMPOTENCY_", extra="ignore")
+
+settings = IdempotencySettings()
+
+@dataclass
+class StoredResponse:
+    request_hash: str
+    status_code: int | None
+    body: Any
+
+    @property
+    def in_flight(self) -> bool:
+        return self.status_code is None
+
+class PostgresIdempotencyStore:
+    """Keeps claims and responses in the idempotency_keys table, outside of the request's own session."""
+
+    async def claim(self, key: str, request_hash: str, claim_token: str) -> StoredResponse | None:
+        now = datetime.now(timezone.utc)
+
+        async with async_session_maker() as db:
+            # Waiting duplicates poll through here, so a live key costs them a single read.
+            result = await db.execute(select(IdempotencyRecord).where(IdempotencyRecord.key == key))
+            record = result.scalar_one_or_none()
+            if record is not None and record.expires_at >= now:
+                return StoredResponse(record.request_hash, record.status_code, record.response_body)
+
+            if record is not None:
+                await db.execute(
+                    delete(IdempotencyRecord).where(IdempotencyRecord.key == key, IdempotencyRecord.expires_at < now)
+                )
+            # The claim is held for the full TTL: if the worker dies mid-request there is no telling whether
+            # the write happened, so duplicates get 409 instead of a second write.
+            stmt = (
+                insert(IdempotencyRecord)
+                .values(
+                    key=key,
+                    request_hash=request_hash,
+                    claim_token=claim_token,
+                    expires_at=now + timedelta(seconds=settings.ttl_seconds),
+                )
+                .on_conflict_do_nothing(index_elements=[IdempotencyRecord.key])
+                .returning(IdempotencyRecord.key)
+            )
+            claimed = (await db.execute(stmt)).scalar_one_or_none()
+            await db.commit()
+
+        if claimed is not None:
+            return None
+        # Another request claimed it first, the caller polls again.
+        return StoredResponse(request_hash, None, None)
+
+    async def save(self, key: str, claim_token: str, request_hash: str, status_code: int, body: Any) -> bool:
+        async with async_session_maker() as db:
+            result = await db.execute(
+                update(IdempotencyRecord)
+                .where(
+                    IdempotencyRecord.key == key,
+                    IdempotencyRecord.claim_token == claim_token,
+                    IdempotencyRecord.status_code.is_(None)
+                )
+                .values(
+                    status_code=status_code,
+                    response_body=body,
+                    expires_at=datetime.now(timezone.utc) + timedelta(seconds=settings.ttl_seconds),
+                )
+            )
+            await db.commit()
+
+        return result.rowcount == 1
+
+    async def release(self, key: str, claim_token: str) -> None:
+        async with async_session_maker() as db:
+            await db.execute(
+                delete(IdempotencyRecord).where(
+                    IdempotencyRecord.key == key,
+                    IdempotencyRecord.claim_token == claim_token,
+                    IdempotencyRecord.status_code.is_(None)
+                )
+            )
+            await db.commit()
+
+    async def purge_expired(self) -> None:
+        async with async_session_maker() as db:
+            await db.execute(delete(IdempotencyRecord).where(IdempotencyRecord.expires_at < datetime.now(timezone.utc)))
+            await db.commit()
+
+# Both scripts only touch the key while it still holds the caller's pending claim.
+REDIS_SAVE_SCRIPT = """
+local raw = redis.call('GET', KEYS[1])
+if not raw then return 0 end
+local data = cjson.decode(raw)
+if data['claim_token'] ~= ARGV[1] or data['status_code'] ~= cjson.null then return 0 end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+REDIS_RELEASE_SCRIPT = """
+local raw = redis.call('GET', KEYS[1])
+if not raw then return 0 end
+local data = cjson.decode(raw)
+if data['claim_token'] ~= ARGV[1] or data['status_code'] ~= cjson.null then return 0 end
+return redis.call('DEL', KEYS[1])
+"""
+
+class RedisIdempotencyStore:
+    """Same contract as the Postgres store, with the lock and response TTLs handled by Redis expiry."""
+
+    def __init__(self, url: str):
+        self.redis = aioredis.from_url(url, decode_responses=True)
+        self.save_script = self.redis.register_script(REDIS_SAVE_SCRIPT)
+        self.release_script = self.redis.register_script(REDIS_RELEASE_SCRIPT)
+
+    @staticmethod
+    def _name(key: str) -> str:
+        return f"idempotency:{key}"
+
+    async def claim(self, key: str, request_hash: str, claim_token: str) -> StoredResponse | None:
+        pending = json.dumps({
+            "request_hash": request_hash,
+            "claim_token": claim_token,
+            "status_code": None,
+            "body": None
+        })
+        if await self.redis.set(self._name(key), pending, nx=True, ex=settings.ttl_seconds):
+            return None
+
+        raw = await self.redis.get(self._name(key))
+        if raw is None:
+            # Expired between SET and GET, the caller simply tries again.
+            return StoredResponse(request_hash, None, None)
+
+        data = json.loads(raw)
+        return StoredResponse(data["request_hash"], data["status_code"], data["body"])
+
+    async def save(self, key: str, claim_token: str, request_hash: str, status_code: int, body: Any) -> bool:
+        stored = json.dumps({
+            "request_hash": request_hash,
+            "claim_token": claim_token,
+            "status_code": status_code,
+            "body": body
+        })
+        saved = await self.save_script(keys=[self._name(key)], args=[claim_token, stored, settings.ttl_seconds])
+
+        return saved == 1
+
+    async def release(self, key: str, claim_token: str) -> None:
+        await self.release_script(keys=[self._name(key)], args=[claim_token])
+
+    async def purge_expired(self) -> None:
+        # Redis drops expired keys on its own.
+        pass
+
+def get_store() -> PostgresIdempotencyStore | RedisIdempotencyStore:
+    if settings.backend == "redis":
+        return RedisIdempotencyStore(settings.redis_url)
+    return PostgresIdempotencyStore()
+
+store = get_store()
+
+async def purge_expired_loop() -> None:
+    """Started from the app lifespan, so finished and abandoned keys actually leave storage after their TTL."""
+    while True:
+        try:
+            await store.purge_expired()
+        except Exception:
+            logger.exception("Failed to purge expired idempotency keys")
+        await asyncio.sleep(settings.purge_interval_seconds)
+
+class IdempotencyContext:
+    """Handed to the endpoint: return `replay` if it is set, otherwise pass the result through `save`."""
+
+    def __init__(self, request: Request, key: str | None = None, request_hash: str | None = None):
+        self.request = request
+        self.key = key
+        self.request_hash = request_hash
+        self.claim_token = secrets.token_hex(16)
+        self.replay: JSONResponse | None = None
+        self.owner = False
+        self.completed = False
+
+    async def save(self, body: Any, status_code: int | None = None) -> Any:
+        if not self.owner:
+            return body
+
+        route = self.request.scope.get("route")
+        status_code = status_code or getattr(route, "status_code", None) or status.HTTP_200_OK
+
+        # The domain write is committed by now, so a store failure must not turn into an error the client
+        # retries. The claim is kept pending for the full TTL and duplicates get 409 instead of repeating the write.
+        self.completed = True
+        try:
+            saved = await store.save(self.key, self.claim_token, self.request_hash, status_code, jsonable_encoder(body))
+        except Exception:
+            logger.exception("Failed to store the idempotent response")
+        else:
+            if not saved:
+                logger.warning("Idempotency claim was lost before the response was stored")
+
+        return body
+
+def build_key(request: Request, user_id: int, idempotency_key: str) -> str:
+    # Scoped by user and route, so the same key sent by another user or to another endpoint never replays,
+    # while a retry made with a refreshed access token still does.
+    scope = "\n".join([request.method, request.url.path, str(user_id), idempotency_key])
+    return hashlib.sha256(scope.encode()).hexdigest()
+
+async def idempotency(
+    request: Request,
+    principal: Annotated[User | TokenData, Depends(get_current_principal)],
+    idempotency_key: Annotated[str | None, Header(max_length=255)] = None,
+) -> AsyncGenerator[IdempotencyContext, None]:
+    if idempotency_key is None:
+        yield IdempotencyContext(request)
+        return
+
+    request_hash = hashlib.sha256(await request.body()).hexdigest()
+    ctx = IdempotencyContext(request, build_key(request, principal.id, idempotency_key), request_hash)
+    deadline = asyncio.get_running_loop().time() + settings.wait_timeout_seconds
+    poll_interval = settings.poll_interval_seconds
+
+    while True:
+        stored = await store.claim(ctx.key, request_hash, ctx.claim_token)
+        if stored is None:
+            ctx.owner = True
+            break
+
+        if stored.request_hash != request_hash:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key was already used with a different request body"
+            )
+
+        if not stored.in_flight:
+            ctx.replay = JSONResponse(
+                status_code=stored.status_code,
+                content=stored.body,
+                headers={"Idempotent-Replayed": "true"}
+            )
+            break
+
+        if asyncio.get_running_loop().time() >= deadline:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A request with this Idempotency-Key is still in progress"
+            )
+        await asyncio.sleep(poll_interval)
+        poll_interval = min(poll_interval * 2, settings.max_poll_interval_seconds)
+
+    try:
+        yield ctx
+    finally:
+        # Failed requests that never reached `save` give the key back so a retry can run the write again.
+        if ctx.owner and not ctx.completed:
+            await store.release(ctx.key, ctx.claim_token)
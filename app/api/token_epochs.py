@@ -0,0 +1,81 @@
+import asyncio
+import logging
+import time
+
+from sqlalchemy import select
+
+from app.db.session import async_session_maker
+from app.models.models import User, UserRole
+
+logger = logging.getLogger(__name__)
+
+class TokenEpochCache:
+    """In-memory user_id -> (token_epoch, role) map of the users seen in the last `idle_seconds`.
+
+    A background task (`run`) re-reads just those users every `refresh_seconds` and drops the idle ones,
+    a user missing from the map is looked up on their next request. Requests only read the current map.
+    `publish` is the local stand-in for a pub/sub push: it applies a bumped epoch in this process right away.
+    """
+
+    reload_batch_size = 1000
+
+    def __init__(self, refresh_seconds: float, idle_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self.idle_seconds = idle_seconds
+        self.users: dict[int, tuple[int, UserRole]] = {}
+        self.last_seen: dict[int, float] = {}
+
+    def evict_idle(self) -> None:
+        cutoff = time.monotonic() - self.idle_seconds
+        for user_id, seen_at in list(self.last_seen.items()):
+            if seen_at < cutoff:
+                self.users.pop(user_id, None)
+                del self.last_seen[user_id]
+
+    async def refresh(self) -> None:
+        self.evict_idle()
+        user_ids = list(self.users)
+
+        for start in range(0, len(user_ids), self.reload_batch_size):
+            batch = user_ids[start:start + self.reload_batch_size]
+            async with async_session_maker() as db:
+                result = await db.execute(select(User.id, User.token_epoch, User.role).where(User.id.in_(batch)))
+                rows = {user_id: (epoch, role) for user_id, epoch, role in result.all()}
+
+            # Updated in place, so users looked up while the SELECT ran are kept.
+            for user_id in batch:
+                if user_id not in rows:
+                    self.users.pop(user_id, None)
+                    self.last_seen.pop(user_id, None)
+                    continue
+                current = self.users.get(user_id)
+                epoch, role = rows[user_id]
+                # Epochs only grow, so a newer one published while the SELECT ran must win over the snapshot.
+                if current is None or epoch >= current[0]:
+                    self.users[user_id] = (epoch, role)
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Failed to reload token epochs")
+            await asyncio.sleep(self.refresh_seconds)
+
+    async def get(self, user_id: int) -> tuple[int, UserRole] | None:
+        if user_id not in self.users:
+            async with async_session_maker() as db:
+                result = await db.execute(select(User.token_epoch, User.role).where(User.id == user_id))
+                row = result.one_or_none()
+            if row is None:
+                return None
+            self.publish(user_id, row.token_epoch, row.role)
+
+        self.last_seen[user_id] = time.monotonic()
+        return self.users[user_id]
+
+    def publish(self, user_id: int, epoch: int, role: UserRole) -> None:
+        current = self.users.get(user_id)
+        if current is None or epoch >= current[0]:
+            self.users[user_id] = (epoch, role)
+            self.last_seen.setdefault(user_id, time.monotonic())
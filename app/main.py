@@ -1,6 +1,19 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from app.api.authorization import router as auth_router
+from app.api.authorization import router as auth_router, epoch_cache, settings as auth_settings
+from app.api.idempotency import purge_expired_loop
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tasks = [asyncio.create_task(purge_expired_loop())]
+    if auth_settings.stateless_roles:
+        tasks.append(asyncio.create_task(epoch_cache.run()))
+    yield
+    for task in tasks:
+        task.cancel()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
-app.include_router(auth_router)
\ No newline at end of file
+app.include_router(auth_router)
@@ -1,5 +1,6 @@
-from sqlalchemy.orm import relationship, mapped_column, Mapped, DeclarativeBase
-from sqlalchemy import Integer, String, ForeignKey, TIMESTAMP, func, Boolean, Text, Enum as SQLEnum
+from sqlalchemy.orm import relationship, mapped_column, Mapped, DeclarativeBase, validates
+from sqlalchemy import Integer, String, ForeignKey, TIMESTAMP, func, Boolean, Text, Enum as SQLEnum, inspect
+from sqlalchemy.dialects.postgresql import JSONB
 
 from datetime import datetime
 from typing import List
@@ -33,6 +34,7 @@ class User(Base):
     phone_number: Mapped[str] = mapped_column(String(30), unique=True, nullable=False)
 
     role: Mapped[UserRole] = mapped_column(SQLEnum(UserRole), server_default="buyer", nullable=False)
+    token_epoch: Mapped[int] = mapped_column(Integer, server_default="0", nullable=False)
 
     hashed_password: Mapped[str] = mapped_column(String(225))
     
@@ -43,6 +45,15 @@ class User(Base):
 
     products: Mapped[List["Product"]] = relationship(back_populates="owner")
 
+    @validates("role")
+    def bump_epoch_on_role_change(self, key, role):
+        # Access tokens carry the role, so changing it has to invalidate them. Only saved users can hold tokens,
+        # and the increment runs in SQL on their UPDATE, reading the loaded state so it never triggers a lazy load.
+        previous = self.__dict__.get("role")
+        if inspect(self).persistent and previous is not None and role != previous:
+            self.token_epoch = User.token_epoch + 1
+        return role
+
 #Product
 class Product(Base):
     __tablename__ = "products"
@@ -75,6 +86,8 @@ class Category(Base):
 
 #ItemInOrder
 class OrderItem(Base):
+    __tablename__ = "order_items"
+
     id: Mapped[int] = mapped_column(primary_key=True)
 
     order_id: Mapped[int] = mapped_column(ForeignKey("orders.id"))
@@ -101,4 +114,18 @@ class Order(Base):
     created_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), server_default=func.now())
 
     user: Mapped["User"] = relationship()
-    items: Mapped["OrderItem"] = relationship(back_populates="order")
\ No newline at end of file
+    items: Mapped["OrderItem"] = relationship(back_populates="order")
+
+#IdempotencyKey
+class IdempotencyRecord(Base):
+    __tablename__ = "idempotency_keys"
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    request_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+    claim_token: Mapped[str] = mapped_column(String(32), nullable=False)
+
+    status_code: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    response_body: Mapped[dict | list | None] = mapped_column(JSONB, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), server_default=func.now())
+    expires_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), index=True, nullable=False)
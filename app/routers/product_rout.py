@@ -4,7 +4,7 @@ from fastapi import Depends, APIRouter, HTTPException, status, Query
 from sqlalchemy import select, update, delete
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.dependencies import DBSession, AllowAdmin, AllowSeller, AllowAll
+from app.api.dependencies import DBSession, AllowAdmin, AllowSeller, AllowAll, Idempotent
 from app.models.models import User, Product
 from app.schemas.product_schema import ProductCreate, ProductUpdate, ProductInDB, ProductInPublic
 from app.crud import product as prod_crud
@@ -12,8 +12,13 @@ from app.crud import product as prod_crud
 router = APIRouter(prefix="/product", tags=["products"])
 
 @router.post("/", response_model=ProductInDB, status_code=201)
-async def create_product(product_data: ProductCreate, db: DBSession, current_user: AllowSeller):
-    return await prod_crud.create_product(db=db, product_in=product_data, owner_id=current_user.id)
+async def create_product(product_data: ProductCreate, db: DBSession, current_user: AllowSeller, idempotency: Idempotent):
+    if idempotency.replay:
+        return idempotency.replay
+
+    product = await prod_crud.create_product(db=db, product_in=product_data, owner_id=current_user.id)
+
+    return await idempotency.save(ProductInDB.model_validate(product))
     
 @router.get("/my", response_model=list[ProductInDB], status_code=200)
 async def get_my_products(db: DBSession, current_user: AllowAll):
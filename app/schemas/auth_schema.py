@@ -1,11 +1,15 @@
 from pydantic import BaseModel
 
+from app.models.models import UserRole
+
 class Token(BaseModel):
     token_type: str
     access_token: str
     refresh_token: str | None
 
 class TokenData(BaseModel):
-    user_id: int
+    id: int
     username: str
+    role: UserRole
+    token_epoch: int
     
\ No newline at end of file
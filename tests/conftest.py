@@ -0,0 +1,9 @@
+import os
+
+# Settings classes are instantiated at import time, so they need these before any app module is imported.
+os.environ.setdefault("AUTH_SECRET_KEY", "test-secret")
+os.environ.setdefault("POSTGRES_USER", "test")
+os.environ.setdefault("POSTGRES_PASSWORD", "test")
+os.environ.setdefault("POSTGRES_DB", "test")
+os.environ.setdefault("POSTGRES_HOST", "localhost")
+os.environ.setdefault("POSTGRES_PORT", "5432")
@@ -0,0 +1,146 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.api import idempotency as idem
+from app.api.authorization import get_current_principal
+from app.api.dependencies import Idempotent
+from app.models.models import UserRole
+from app.schemas.auth_schema import TokenData
+
+class MemoryIdempotencyStore:
+    def __init__(self):
+        self.records = {}
+
+    async def claim(self, key, request_hash, claim_token):
+        if key not in self.records:
+            self.records[key] = {"request_hash": request_hash, "claim_token": claim_token, "status_code": None, "body": None}
+            return None
+        record = self.records[key]
+        return idem.StoredResponse(record["request_hash"], record["status_code"], record["body"])
+
+    async def save(self, key, claim_token, request_hash, status_code, body):
+        record = self.records.get(key)
+        if not record or record["claim_token"] != claim_token or record["status_code"] is not None:
+            return False
+        record.update(status_code=status_code, body=body)
+        return True
+
+    async def release(self, key, claim_token):
+        record = self.records.get(key)
+        if record and record["claim_token"] == claim_token and record["status_code"] is None:
+            del self.records[key]
+
+    async def purge_expired(self):
+        pass
+
+@pytest.fixture
+def store(monkeypatch):
+    store = MemoryIdempotencyStore()
+    monkeypatch.setattr(idem, "store", store)
+    monkeypatch.setattr(idem.settings, "poll_interval_seconds", 0.01)
+    monkeypatch.setattr(idem.settings, "wait_timeout_seconds", 1)
+    return store
+
+@pytest.fixture
+def app():
+    app = FastAPI()
+    app.state.calls = []
+    app.state.gate = asyncio.Event()
+    app.state.gate.set()
+    app.state.fail = False
+
+    @app.post("/items", status_code=201)
+    async def create_item(payload: dict, idempotency: Idempotent):
+        if idempotency.replay:
+            return idempotency.replay
+
+        app.state.calls.append(payload)
+        await app.state.gate.wait()
+        if app.state.fail:
+            raise RuntimeError("write failed")
+
+        return await idempotency.save({"id": len(app.state.calls), **payload})
+
+    app.dependency_overrides[get_current_principal] = lambda: TokenData(
+        id=1, username="seller", role=UserRole.SELLER, token_epoch=0
+    )
+    return app
+
+@pytest.fixture
+def client(app):
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    return httpx.AsyncClient(transport=transport, base_url="http://test")
+
+@pytest.mark.asyncio
+async def test_replay_returns_stored_response(app, client, store):
+    headers = {"Idempotency-Key": "abc"}
+
+    first = await client.post("/items", json={"title": "lamp"}, headers=headers)
+    second = await client.post("/items", json={"title": "lamp"}, headers=headers)
+
+    assert first.status_code == 201
+    assert second.status_code == 201
+    assert second.json() == first.json() == {"id": 1, "title": "lamp"}
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert len(app.state.calls) == 1
+
+@pytest.mark.asyncio
+async def test_same_key_with_different_body_is_rejected(app, client, store):
+    headers = {"Idempotency-Key": "abc"}
+
+    await client.post("/items", json={"title": "lamp"}, headers=headers)
+    response = await client.post("/items", json={"title": "chair"}, headers=headers)
+
+    assert response.status_code == 422
+    assert len(app.state.calls) == 1
+
+@pytest.mark.asyncio
+async def test_concurrent_duplicate_waits_and_replays(app, client, store):
+    headers = {"Idempotency-Key": "abc"}
+    app.state.gate.clear()
+
+    first = asyncio.create_task(client.post("/items", json={"title": "lamp"}, headers=headers))
+    await asyncio.sleep(0.05)
+    second = asyncio.create_task(client.post("/items", json={"title": "lamp"}, headers=headers))
+    await asyncio.sleep(0.05)
+    assert not second.done()
+
+    app.state.gate.set()
+    first, second = await first, await second
+
+    assert first.status_code == second.status_code == 201
+    assert second.json() == first.json()
+    assert len(app.state.calls) == 1
+
+@pytest.mark.asyncio
+async def test_failed_request_releases_key(app, client, store):
+    headers = {"Idempotency-Key": "abc"}
+    app.state.fail = True
+
+    failed = await client.post("/items", json={"title": "lamp"}, headers=headers)
+    app.state.fail = False
+    retried = await client.post("/items", json={"title": "lamp"}, headers=headers)
+
+    assert failed.status_code == 500
+    assert retried.status_code == 201
+    assert len(app.state.calls) == 2
+
+@pytest.mark.asyncio
+async def test_claim_is_kept_when_storing_the_response_fails(app, client, store, monkeypatch):
+    headers = {"Idempotency-Key": "abc"}
+    monkeypatch.setattr(idem.settings, "wait_timeout_seconds", 0.05)
+
+    async def broken_save(*args):
+        raise ConnectionError("store unavailable")
+
+    monkeypatch.setattr(store, "save", broken_save)
+    first = await client.post("/items", json={"title": "lamp"}, headers=headers)
+    retried = await client.post("/items", json={"title": "lamp"}, headers=headers)
+
+    assert first.status_code == 201
+    assert first.json() == {"id": 1, "title": "lamp"}
+    assert retried.status_code == 409
+    assert len(app.state.calls) == 1
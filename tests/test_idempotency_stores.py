@@ -0,0 +1,68 @@
+import os
+import uuid
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.api import idempotency as idem
+from app.models.models import IdempotencyRecord
+
+# Run against real services: TEST_DATABASE_URL=postgresql+asyncpg://... and/or TEST_REDIS_URL=redis://...
+DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+REDIS_URL = os.environ.get("TEST_REDIS_URL")
+
+@pytest_asyncio.fixture(params=[
+    pytest.param("postgres", marks=pytest.mark.skipif(not DATABASE_URL, reason="TEST_DATABASE_URL not set")),
+    pytest.param("redis", marks=pytest.mark.skipif(not REDIS_URL, reason="TEST_REDIS_URL not set")),
+])
+async def store(request, monkeypatch):
+    if request.param == "redis":
+        store = idem.RedisIdempotencyStore(REDIS_URL)
+        yield store
+        await store.redis.aclose()
+        return
+
+    engine = create_async_engine(DATABASE_URL)
+    async with engine.begin() as conn:
+        await conn.run_sync(IdempotencyRecord.__table__.create, checkfirst=True)
+    monkeypatch.setattr(idem, "async_session_maker", async_sessionmaker(bind=engine, class_=AsyncSession))
+
+    yield idem.PostgresIdempotencyStore()
+
+    await engine.dispose()
+
+@pytest.fixture
+def key():
+    return uuid.uuid4().hex
+
+@pytest.mark.asyncio
+async def test_claim_save_and_replay(store, key):
+    assert await store.claim(key, "hash", "first") is None
+    assert (await store.claim(key, "hash", "second")).in_flight
+
+    assert await store.save(key, "first", "hash", 201, {"id": 1}) is True
+
+    stored = await store.claim(key, "hash", "second")
+    assert (stored.status_code, stored.body) == (201, {"id": 1})
+
+@pytest.mark.asyncio
+async def test_save_and_release_require_the_claim_token(store, key):
+    await store.claim(key, "hash", "first")
+
+    assert await store.save(key, "other", "hash", 201, {"id": 1}) is False
+    await store.release(key, "other")
+
+    assert (await store.claim(key, "hash", "second")).in_flight
+    assert await store.save(key, "first", "hash", 201, {"id": 1}) is True
+
+@pytest.mark.asyncio
+async def test_saved_response_is_neither_overwritten_nor_released(store, key):
+    await store.claim(key, "hash", "first")
+    await store.save(key, "first", "hash", 201, {"id": 1})
+
+    assert await store.save(key, "first", "hash", 500, {"detail": "late"}) is False
+    await store.release(key, "first")
+
+    stored = await store.claim(key, "hash", "second")
+    assert (stored.status_code, stored.body) == (201, {"id": 1})
@@ -0,0 +1,139 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.api import authorization as auth
+from app.api import token_epochs
+from app.api.token_epochs import TokenEpochCache
+from app.models.models import User, UserRole
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = TokenEpochCache(refresh_seconds=5, idle_seconds=60)
+    monkeypatch.setattr(auth, "epoch_cache", cache)
+    monkeypatch.setattr(auth.settings, "stateless_roles", True)
+    return cache
+
+def make_token(role: UserRole = UserRole.SELLER, epoch: int = 0) -> str:
+    return auth.create_access_token(data={"sub": "seller", "uid": 7, "role": role.value, "token_epoch": epoch})
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+class FakeSession:
+    def __init__(self, rows, on_execute=None):
+        self.rows = rows
+        self.on_execute = on_execute
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def execute(self, stmt):
+        if self.on_execute:
+            self.on_execute()
+        return FakeResult(self.rows)
+
+@pytest.mark.asyncio
+async def test_principal_is_built_from_claims(cache):
+    cache.publish(7, 0, UserRole.SELLER)
+
+    principal = await auth.get_current_principal(make_token(), db=None)
+
+    assert (principal.id, principal.username, principal.role) == (7, "seller", UserRole.SELLER)
+
+@pytest.mark.asyncio
+async def test_token_is_rejected_after_epoch_bump(cache):
+    cache.publish(7, 0, UserRole.SELLER)
+    token = make_token()
+    cache.publish(7, 1, UserRole.SELLER)
+
+    with pytest.raises(HTTPException) as exc:
+        await auth.get_current_principal(token, db=None)
+    assert exc.value.status_code == 401
+
+@pytest.mark.asyncio
+async def test_token_with_stale_role_is_rejected(cache):
+    # Role edited directly in the database, without an epoch bump.
+    cache.publish(7, 0, UserRole.BUYER)
+
+    with pytest.raises(HTTPException) as exc:
+        await auth.get_current_principal(make_token(role=UserRole.SELLER), db=None)
+    assert exc.value.status_code == 401
+
+@pytest.mark.asyncio
+async def test_reload_keeps_epoch_published_during_select(cache, monkeypatch):
+    cache.publish(7, 0, UserRole.SELLER)
+    session = FakeSession([(7, 0, UserRole.SELLER)], on_execute=lambda: cache.publish(7, 1, UserRole.BUYER))
+    monkeypatch.setattr(token_epochs, "async_session_maker", lambda: session)
+
+    await cache.refresh()
+
+    assert cache.users == {7: (1, UserRole.BUYER)}
+
+@pytest.mark.asyncio
+async def test_reload_picks_up_role_changes(cache, monkeypatch):
+    cache.publish(7, 0, UserRole.SELLER)
+    monkeypatch.setattr(token_epochs, "async_session_maker", lambda: FakeSession([(7, 0, UserRole.BUYER)]))
+
+    await cache.refresh()
+
+    assert cache.users[7] == (0, UserRole.BUYER)
+
+@pytest.mark.asyncio
+async def test_reload_drops_idle_and_deleted_users(cache, monkeypatch):
+    cache.publish(7, 0, UserRole.SELLER)
+    cache.publish(8, 0, UserRole.BUYER)
+    cache.publish(9, 0, UserRole.BUYER)
+    cache.last_seen[9] -= cache.idle_seconds + 1
+    # User 8 was deleted, user 9 has been idle and is not reloaded at all.
+    monkeypatch.setattr(token_epochs, "async_session_maker", lambda: FakeSession([(7, 0, UserRole.SELLER)]))
+
+    await cache.refresh()
+
+    assert cache.users == {7: (0, UserRole.SELLER)}
+    assert set(cache.last_seen) == {7}
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    User.__table__.create(engine)
+    with Session(engine) as session:
+        yield session
+
+def make_user(role: UserRole) -> User:
+    return User(
+        first_name="Test",
+        last_name="Seller",
+        username="seller",
+        email="seller@example.com",
+        phone_number="+100000000",
+        hashed_password="hash",
+        role=role
+    )
+
+def test_new_user_saves_with_epoch_zero(db):
+    user = make_user(UserRole.BUYER)
+    user.role = UserRole.ADMIN
+    db.add(user)
+    db.commit()
+
+    assert (user.role, user.token_epoch) == (UserRole.ADMIN, 0)
+
+def test_role_change_on_loaded_user_bumps_epoch(db):
+    db.add(make_user(UserRole.SELLER))
+    db.commit()
+    db.expunge_all()
+
+    user = db.query(User).one()
+    user.role = UserRole.BUYER
+    db.commit()
+
+    assert (user.role, user.token_epoch) == (UserRole.BUYER, 1)